@@ -9,13 +9,19 @@ Phase 3: Auto-hangup after bot says goodbye via LLM function calling.
 """
 
 import asyncio
+import copy
 import datetime
+import functools
 import json
 import os
+import time
 import wave
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
-from dotenv import load_dotenv
+from aiortc import RTCPeerConnection, rtcrtpreceiver
+from aiortc.jitterbuffer import JitterBuffer
+from dateutil.parser import isoparse
 from loguru import logger
 from pipecat.adapters.schemas.function_schema import FunctionSchema
 from pipecat.adapters.schemas.tools_schema import ToolsSchema
@@ -43,8 +49,6 @@ from knowledge import load_prompt
 from utils import detect_handoff, extract_topics, generate_id
 from whatsapp_messaging import send_followup_message
 
-load_dotenv(override=True)
-
 # Ensure recordings directory exists
 RECORDINGS_DIR = Path(__file__).parent / "recordings"
 RECORDINGS_DIR.mkdir(exist_ok=True)
@@ -54,6 +58,46 @@ _BUSINESS_NAME = os.getenv("BUSINESS_NAME", "Our Business")
 _BUSINESS_SHORT = os.getenv("BUSINESS_SHORT", "")
 _BUSINESS_CITY = os.getenv("BUSINESS_CITY", "")
 
+GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
+
+# Outbound audio frame size in 10ms units. Smaller = lower latency to the caller,
+# larger = fewer frames/packets and more tolerance for event-loop jitter.
+VOICE_AUDIO_OUT_10MS_CHUNKS = max(1, int(os.getenv("VOICE_AUDIO_OUT_10MS_CHUNKS", "1")))
+
+# Inbound audio jitter buffer (aiortc defaults: capacity=16, prefetch=4 packets,
+# i.e. ~80ms held back at 20ms/packet). Lower prefetch = less latency on the
+# caller's audio, more risk of gaps on jittery networks. Capacity: power of 2.
+VOICE_JITTER_PREFETCH = max(0, int(os.getenv("VOICE_JITTER_PREFETCH", "2")))
+VOICE_JITTER_CAPACITY = int(os.getenv("VOICE_JITTER_CAPACITY", "16"))
+
+
+def _tune_audio_jitter_buffer():
+    """Make aiortc build audio jitter buffers with our prefetch/capacity.
+
+    Neither pipecat nor aiortc exposes these settings; RTCRtpReceiver hardcodes
+    JitterBuffer(capacity=16, prefetch=4) for audio, looking the class up in
+    its module at construction time, so we swap in a factory there.
+    """
+    capacity = VOICE_JITTER_CAPACITY
+    if capacity < 2 or capacity & (capacity - 1):
+        logger.warning(f"VOICE_JITTER_CAPACITY={capacity} is not a power of 2, using 16")
+        capacity = 16
+    prefetch = min(VOICE_JITTER_PREFETCH, capacity // 2)
+
+    def jitter_buffer_factory(*args, is_video=False, **kwargs):
+        if not is_video:
+            kwargs.update(capacity=capacity, prefetch=prefetch)
+            args = ()
+        return JitterBuffer(*args, is_video=is_video, **kwargs)
+
+    rtcrtpreceiver.JitterBuffer = jitter_buffer_factory
+
+
+_tune_audio_jitter_buffer()
+
+# Process-wide google-genai clients keyed by (api_key, http_options), shared by all calls
+_gemini_clients: dict = {}
+
 # Hardcoded fallback — only used if knowledge/prompt_voice.md is missing
 _DEFAULT_VOICE_PROMPT = """You are an AI voice assistant for {business_name}{business_location}.
 
@@ -87,43 +131,138 @@ _end_call_function = FunctionSchema(
 )
 _tools = ToolsSchema(standard_tools=[_end_call_function])
 
+
+class SharedClientGeminiLiveLLMService(GeminiLiveLLMService):
+    """GeminiLiveLLMService that reuses one google-genai Client across calls.
+
+    The Live websocket session is per call, but the client (API config, HTTP
+    transport and TLS context) is not, so it is created once per process.
+    """
+
+    def create_client(self):
+        key = (self._api_key, repr(self._http_options))
+        client = _gemini_clients.get(key)
+        if client is None:
+            super().create_client()
+            _gemini_clients[key] = self._client
+        else:
+            self._client = client
+
+
+# Stand-in for {knowledge} while formatting branding placeholders; can't occur in a prompt file
+_KNOWLEDGE_MARKER = "\x00knowledge\x00"
+
+
+@functools.lru_cache(maxsize=4)
+def _split_voice_prompt(voice_prompt: str) -> tuple[str, ...]:
+    """Fill branding placeholders once and split the prompt around {knowledge}.
+
+    Returns the prompt pieces between {knowledge} occurrences, so building the
+    system instruction is a plain join instead of a str.format() parse.
+    """
+    business_location = f", {_BUSINESS_CITY}" if _BUSINESS_CITY else ""
+    business_label = _BUSINESS_NAME
+    if _BUSINESS_SHORT and _BUSINESS_SHORT != _BUSINESS_NAME:
+        business_label = f"{_BUSINESS_NAME} ({_BUSINESS_SHORT})"
+    formatted = voice_prompt.format(
+        knowledge=_KNOWLEDGE_MARKER,
+        business_name=business_label,
+        business_short=_BUSINESS_SHORT or _BUSINESS_NAME,
+        business_location=business_location,
+    )
+    return tuple(formatted.split(_KNOWLEDGE_MARKER))
+
+
+@functools.lru_cache(maxsize=4)
+def _build_system_instruction(voice_prompt: str, knowledge: str) -> str:
+    """Format the voice prompt with knowledge + branding.
+
+    Cached so calls sharing the same knowledge revision reuse one prompt string
+    instead of re-building it per call.
+    """
+    knowledge = knowledge or "No knowledge documents loaded yet."
+    return knowledge.join(_split_voice_prompt(voice_prompt))
+
+
+def create_vad_analyzer(shared: SileroVADAnalyzer | None = None) -> SileroVADAnalyzer:
+    """Create a per-call VAD analyzer.
+
+    Loading the Silero ONNX model is slow, so when a pre-loaded analyzer is
+    given, the new analyzer shares its inference session and only gets fresh
+    per-stream state. It also gets its own single-thread executor (pipecat
+    runs one per analyzer), so calls don't queue VAD inference on one thread.
+    Falls back to a full load if the model layout is unknown.
+    """
+    model = getattr(shared, "_model", None)
+    if model is None or not hasattr(model, "reset_states"):
+        return SileroVADAnalyzer()
+
+    vad = copy.copy(shared)
+    vad._model = copy.copy(model)
+    vad._model.reset_states()
+    if hasattr(shared, "_executor"):
+        vad._executor = ThreadPoolExecutor(max_workers=1)
+    return vad
+
+
+async def warm_up():
+    """Exercise the WebRTC setup path once at startup.
+
+    The first RTCPeerConnection pays one-time costs (OpenSSL bindings, codec
+    registration, SDP generation); doing it here keeps them off the first real
+    caller's accept path. Failures are logged, never fatal — a slow first call
+    beats a server that won't start.
+    """
+    started = time.monotonic()
+    pc = None
+    try:
+        pc = RTCPeerConnection()
+        pc.addTransceiver("audio")
+        await pc.createOffer()
+    except Exception as e:
+        logger.warning(f"WebRTC warm-up failed: {e}")
+    finally:
+        if pc is not None:
+            try:
+                await pc.close()
+            except Exception as e:
+                logger.warning(f"WebRTC warm-up close failed: {e}")
+    logger.info(f"WebRTC warm-up done in {(time.monotonic() - started) * 1000:.0f}ms")
+
+
 async def run_bot(
     webrtc_connection,
     knowledge_context: str = "",
     caller_phone: str = "",
     caller_name: str = "",
+    vad_analyzer: SileroVADAnalyzer | None = None,
 ):
     """Run the AI voice bot for a single WhatsApp call.
 
     Captures transcript, records audio, detects handoff requests,
     stores everything in SQLite, and sends post-call notifications.
+
+    Args:
+        vad_analyzer: Pre-loaded analyzer whose model is shared with this call
+            (see create_vad_analyzer). Loaded per call if not given.
     """
     call_id = generate_id()
     logger.info(f"Call {call_id}: Starting bot for {caller_phone} ({caller_name})")
 
     voice_prompt = load_prompt("voice", _DEFAULT_VOICE_PROMPT)
-    business_location = f", {_BUSINESS_CITY}" if _BUSINESS_CITY else ""
-    business_label = _BUSINESS_NAME
-    if _BUSINESS_SHORT and _BUSINESS_SHORT != _BUSINESS_NAME:
-        business_label = f"{_BUSINESS_NAME} ({_BUSINESS_SHORT})"
-    system_instruction = voice_prompt.format(
-        knowledge=knowledge_context or "No knowledge documents loaded yet.",
-        business_name=business_label,
-        business_short=_BUSINESS_SHORT or _BUSINESS_NAME,
-        business_location=business_location,
-    )
+    system_instruction = _build_system_instruction(voice_prompt, knowledge_context)
 
     transport = SmallWebRTCTransport(
         webrtc_connection=webrtc_connection,
         params=TransportParams(
             audio_in_enabled=True,
             audio_out_enabled=True,
-            audio_out_10ms_chunks=2,
+            audio_out_10ms_chunks=VOICE_AUDIO_OUT_10MS_CHUNKS,
         ),
     )
 
-    llm = GeminiLiveLLMService(
-        api_key=os.getenv("GOOGLE_API_KEY"),
+    llm = SharedClientGeminiLiveLLMService(
+        api_key=GOOGLE_API_KEY,
         voice_id="Kore",  # Options: Aoede, Charon, Fenrir, Kore, Puck
         system_instruction=system_instruction,
     )
@@ -142,13 +281,15 @@ async def run_bot(
     user_aggregator, assistant_aggregator = LLMContextAggregatorPair(
         context,
         user_params=LLMUserAggregatorParams(
-            vad_analyzer=SileroVADAnalyzer(),
+            vad_analyzer=create_vad_analyzer(vad_analyzer),
         ),
     )
 
     # Audio recording processor — captures both user and bot audio
     audiobuffer = AudioBufferProcessor(num_channels=1)
 
+    # Gemini Live streams PCM as it's generated; the assistant aggregator and
+    # recorder sit after transport.output() so they never delay playback.
     pipeline = Pipeline(
         [
             transport.input(),
@@ -176,7 +317,7 @@ async def run_bot(
             return
         _finalized = True
 
-        call_metadata["disconnected_at"] = datetime.datetime.now(datetime.timezone.utc).isoformat()
+        call_metadata["disconnected_at"] = datetime.datetime.now(datetime.UTC).isoformat()
         logger.info(f"Call {call_id}: Finalizing call")
 
         transcript = []
@@ -208,7 +349,6 @@ async def run_bot(
             logger.info(f"Call {call_id}: Topics: {topics}")
 
             try:
-                from dateutil.parser import isoparse
                 t1 = isoparse(call_metadata["connected_at"])
                 t2 = isoparse(call_metadata["disconnected_at"])
                 duration_seconds = (t2 - t1).total_seconds()
@@ -338,7 +478,7 @@ async def run_bot(
 
     @transport.event_handler("on_client_connected")
     async def on_connected(transport_obj, client):
-        call_metadata["connected_at"] = datetime.datetime.now(datetime.timezone.utc).isoformat()
+        call_metadata["connected_at"] = datetime.datetime.now(datetime.UTC).isoformat()
         logger.info(f"Call {call_id}: Connected from {caller_phone}")
 
         # Block check: disconnect blocked callers immediately
@@ -11,7 +11,7 @@ import os
 from loguru import logger
 from openai import AsyncOpenAI
 
-from knowledge import load_prompt
+from knowledge import KNOWLEDGE_SELECT_THRESHOLD, load_prompt, select_knowledge
 from chat_db import (
     add_message,
     check_duplicate_message,
@@ -147,6 +147,11 @@ async def _call_gpt4o(knowledge_context: str, messages: list[dict]) -> str:
         logger.error("OPENAI_API_KEY not set")
         return FALLBACK_MESSAGE
 
+    # Large knowledge bases: only send the sections relevant to the recent user turns
+    if len(knowledge_context) > KNOWLEDGE_SELECT_THRESHOLD:
+        query = " ".join(m["content"] for m in messages[-6:] if m["role"] == "user")
+        knowledge_context = select_knowledge(knowledge_context, query)
+
     chatbot_prompt = load_prompt("chatbot", _DEFAULT_CHATBOT_PROMPT)
     system_prompt = chatbot_prompt.format(
         knowledge=knowledge_context or "No knowledge documents loaded yet.",
@@ -3,16 +3,67 @@
 Sends enriched call and chat data to n8n webhooks.
 n8n can then trigger automations: email brief, Telegram notification,
 Google Sheet log, lead creation, handoff alerts, etc.
+
+When N8N_CALL_HOOK_BATCH is on, call summaries are buffered briefly by a
+background flusher (started from the server lifespan) so bursts of finished
+calls are posted together.
 """
 
+import asyncio
 import os
 
 import aiohttp
+import orjson
 from loguru import logger
 
 N8N_CALL_HOOK_URL = os.getenv("N8N_CALL_HOOK_URL", "")
 N8N_CHAT_HOOK_URL = os.getenv("N8N_CHAT_HOOK_URL", "")
 
+# Call summary batching (opt-in). When off, each summary is posted right away
+# as its own call_ended event (for workflows that expect a single call).
+N8N_CALL_HOOK_BATCH = os.getenv("N8N_CALL_HOOK_BATCH", "").lower() in ("1", "true", "yes")
+CALL_HOOK_BATCH_WINDOW = 0.5  # seconds to wait for more summaries before posting
+CALL_HOOK_MAX_BATCH = 32
+HOOK_TIMEOUT = 15  # seconds per n8n POST
+CALL_HOOK_SHUTDOWN_TIMEOUT = HOOK_TIMEOUT + 5  # lets an in-flight POST finish
+
+_JSON_HEADERS = {"Content-Type": "application/json"}
+
+_call_queue: asyncio.Queue | None = None
+_flusher_task: asyncio.Task | None = None
+_inflight_batch: list[dict] | None = None  # Batch being posted; resent if shutdown cancels it
+
+# Shared HTTP session so n8n posts reuse warm TCP/TLS connections
+_session: aiohttp.ClientSession | None = None
+_owns_session = False
+
+
+def init_session(session: aiohttp.ClientSession):
+    """Use an externally managed session (e.g. the one created in server lifespan)."""
+    global _session, _owns_session
+    _session = session
+    _owns_session = False
+
+
+async def get_session() -> aiohttp.ClientSession:
+    """Get or create the shared aiohttp session (lazy singleton)."""
+    global _session, _owns_session
+    if _session is None or _session.closed:
+        _session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=32, keepalive_timeout=60),
+        )
+        _owns_session = True
+    return _session
+
+
+async def close_session():
+    """Close the shared session if this module created it."""
+    global _session, _owns_session
+    if _session is not None and _owns_session and not _session.closed:
+        await _session.close()
+    _session = None
+    _owns_session = False
+
 
 async def send_call_summary(call_data: dict):
     """Send enriched call data to n8n after a call ends.
@@ -51,22 +102,137 @@ async def send_call_summary(call_data: dict):
         "recording_path": call_data.get("recording_path", ""),
     }
 
+    if _call_queue is not None:
+        await _call_queue.put(payload)
+        return
+
+    await _post_call_payload(payload, f"call_id={payload['call_id']}")
+
+
+async def send_call_rejected(caller_phone: str, caller_name: str, reason: str):
+    """Notify n8n that an incoming call was hung up without being answered.
+
+    Args:
+        caller_phone: Caller's WhatsApp number.
+        caller_name: Caller's WhatsApp profile name.
+        reason: Why the call was rejected (e.g. 'busy' when at capacity).
+    """
+    if not N8N_CALL_HOOK_URL:
+        logger.debug("N8N_CALL_HOOK_URL not set, skipping call rejected hook")
+        return
+
+    payload = {
+        "event": "call_rejected",
+        "caller": {
+            "phone": caller_phone,
+            "name": caller_name,
+        },
+        "reason": reason,
+    }
+    await _post_call_payload(payload, f"rejected {caller_phone} ({reason})")
+
+
+async def _post_call_payload(payload: dict, label: str):
+    """POST a call_ended (or call_ended_batch) payload to the n8n call hook."""
     try:
-        async with aiohttp.ClientSession() as session:
-            async with session.post(
-                N8N_CALL_HOOK_URL,
-                json=payload,
-                timeout=aiohttp.ClientTimeout(total=15),
-            ) as resp:
-                if resp.status == 200:
-                    logger.info(f"Call summary sent to n8n: call_id={call_data.get('call_id')}")
-                else:
-                    body = await resp.text()
-                    logger.warning(f"n8n hook returned {resp.status}: {body}")
+        session = await get_session()
+        async with session.post(
+            N8N_CALL_HOOK_URL,
+            data=orjson.dumps(payload),
+            headers=_JSON_HEADERS,
+            timeout=aiohttp.ClientTimeout(total=HOOK_TIMEOUT),
+        ) as resp:
+            if resp.status == 200:
+                logger.info(f"Call summary sent to n8n: {label}")
+            else:
+                body = await resp.text()
+                logger.warning(f"n8n hook returned {resp.status}: {body}")
     except Exception as e:
         logger.error(f"Failed to send call summary to n8n: {e}")
 
 
+async def _send_call_batch(batch: list[dict]):
+    """Post a batch of buffered call summaries."""
+    if len(batch) > 1:
+        await _post_call_payload(
+            {"event": "call_ended_batch", "items": batch},
+            f"{len(batch)} calls",
+        )
+    elif batch:
+        await _post_call_payload(batch[0], f"call_id={batch[0]['call_id']}")
+
+
+async def _flush_call_summaries():
+    """Background task: drain the call queue in batches.
+
+    Waits up to CALL_HOOK_BATCH_WINDOW after the first summary for more to
+    arrive (max CALL_HOOK_MAX_BATCH). A None item means shutdown.
+    """
+    global _inflight_batch
+    loop = asyncio.get_running_loop()
+    stopping = False
+    while not stopping:
+        payload = await _call_queue.get()
+        if payload is None:
+            break
+        batch = [payload]
+        deadline = loop.time() + CALL_HOOK_BATCH_WINDOW
+        while len(batch) < CALL_HOOK_MAX_BATCH:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                payload = await asyncio.wait_for(_call_queue.get(), timeout=remaining)
+            except asyncio.TimeoutError:
+                break
+            if payload is None:
+                stopping = True
+                break
+            batch.append(payload)
+        _inflight_batch = batch
+        await _send_call_batch(batch)
+        _inflight_batch = None
+
+
+def start_call_flusher():
+    """Start buffering call summaries if N8N_CALL_HOOK_BATCH is on.
+
+    Called once from the server lifespan.
+    """
+    global _call_queue, _flusher_task
+    if _flusher_task is not None or not N8N_CALL_HOOK_BATCH:
+        return
+    _call_queue = asyncio.Queue()
+    _flusher_task = asyncio.create_task(_flush_call_summaries())
+
+
+async def stop_call_flusher(timeout: float = CALL_HOOK_SHUTDOWN_TIMEOUT):
+    """Flush any buffered call summaries and stop the background flusher."""
+    global _call_queue, _flusher_task, _inflight_batch
+    if _flusher_task is None:
+        return
+    await _call_queue.put(None)
+    try:
+        await asyncio.wait_for(_flusher_task, timeout=timeout)
+    except asyncio.TimeoutError:
+        logger.warning(f"Call summary flusher did not finish within {timeout}s")
+    except Exception as e:
+        logger.error(f"Call summary flusher error: {e}")
+
+    # A batch cut off mid-POST is resent (n8n may see it twice), followed by
+    # summaries queued behind the shutdown marker
+    pending = _inflight_batch or []
+    _inflight_batch = None
+    while not _call_queue.empty():
+        payload = _call_queue.get_nowait()
+        if payload is not None:
+            pending.append(payload)
+    _call_queue = None
+    _flusher_task = None
+    if pending:
+        await _send_call_batch(pending)
+
+
 async def send_chat_summary(chat_data: dict):
     """Send chat handoff notification to n8n.
 
@@ -97,16 +263,17 @@ async def send_chat_summary(chat_data: dict):
     }
 
     try:
-        async with aiohttp.ClientSession() as session:
-            async with session.post(
-                N8N_CHAT_HOOK_URL,
-                json=payload,
-                timeout=aiohttp.ClientTimeout(total=15),
-            ) as resp:
-                if resp.status == 200:
-                    logger.info(f"Chat summary sent to n8n: conv={chat_data.get('conversation_id')}")
-                else:
-                    body = await resp.text()
-                    logger.warning(f"n8n chat hook returned {resp.status}: {body}")
+        session = await get_session()
+        async with session.post(
+            N8N_CHAT_HOOK_URL,
+            data=orjson.dumps(payload),
+            headers=_JSON_HEADERS,
+            timeout=aiohttp.ClientTimeout(total=HOOK_TIMEOUT),
+        ) as resp:
+            if resp.status == 200:
+                logger.info(f"Chat summary sent to n8n: conv={chat_data.get('conversation_id')}")
+            else:
+                body = await resp.text()
+                logger.warning(f"n8n chat hook returned {resp.status}: {body}")
     except Exception as e:
         logger.error(f"Failed to send chat summary to n8n: {e}")
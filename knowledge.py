@@ -3,20 +3,82 @@
 Reads all markdown files from the knowledge/ directory and combines them
 into a single context string for the AI agent's system prompt.
 
-Files are re-read on each call so you can update docs without restarting the server.
+The combined string is cached and only rebuilt when a file's mtime/size changes,
+so you can update docs without restarting the server. Keeping it byte-identical
+between reloads also lets the LLM providers' prefix caching kick in.
+
+For large knowledge bases, select_knowledge() picks the sections most relevant
+to a query (TF-IDF over doc sections, indexed once per knowledge version).
 """
 
+import asyncio
+import functools
+import io
+import math
 import os
+import re
+import threading
+from collections import Counter
 from pathlib import Path
 
 from loguru import logger
 
 KNOWLEDGE_DIR = Path(__file__).parent / "knowledge"
 
+# Combined knowledge keyed by the (name, mtime_ns, size) signature of each doc
+_cache = {"sig": None, "text": ""}
+_cache_lock = threading.Lock()
+
+# Above this many chars, text chat sends only the sections relevant to the message
+KNOWLEDGE_SELECT_THRESHOLD = int(os.getenv("KNOWLEDGE_SELECT_THRESHOLD", "20000"))
+
+# Docs (file stems) always sent in full by select_knowledge(): behavior rules,
+# not content, so they must never depend on matching the user's words
+KNOWLEDGE_PINNED_DOCS = {
+    name.strip().upper()
+    for name in os.getenv("KNOWLEDGE_PINNED_DOCS", "agent_rules").split(",")
+    if name.strip()
+}
+
+_DOC_HEADER_RE = re.compile(r"^--- (.+) ---$", re.MULTILINE)
+_SECTION_RE = re.compile(r"^## ", re.MULTILINE)
+_TOKEN_RE = re.compile(r"\w+")
+
+
+def _scan() -> tuple[list[Path], list[tuple]]:
+    """List knowledge .md files and their cache signature in one directory pass.
+
+    Skips prompt_* files (loaded separately via load_prompt()). The signature is
+    each file's (name, mtime_ns, size), taken from the scandir entry's stat.
+
+    Returns:
+        Tuple of (files sorted by name, signature).
+    """
+    with os.scandir(KNOWLEDGE_DIR) as it:
+        entries = sorted(
+            (e for e in it
+             if e.name.endswith(".md") and not e.name.startswith("prompt_") and e.is_file()),
+            key=lambda e: e.name,
+        )
+
+    files = []
+    sig = []
+    for entry in entries:
+        try:
+            stat = entry.stat()
+        except OSError:
+            continue
+        files.append(Path(entry.path))
+        sig.append((entry.name, stat.st_mtime_ns, stat.st_size))
+    return files, sig
+
 
 def load_knowledge() -> str:
     """Load all .md files from knowledge/ directory, excluding prompt_* files.
 
+    Returns the cached result when no file has been added, removed or modified
+    since the last load.
+
     Returns:
         Combined content of all knowledge documents.
     """
@@ -24,28 +86,181 @@ def load_knowledge() -> str:
         logger.warning(f"Knowledge directory not found: {KNOWLEDGE_DIR}")
         return ""
 
-    documents = []
-    for md_file in sorted(KNOWLEDGE_DIR.glob("*.md")):
-        # Skip prompt files — they are loaded separately via load_prompt()
-        if md_file.name.startswith("prompt_"):
+    with _cache_lock:
+        files, sig = _scan()
+        if sig == _cache["sig"]:
+            return _cache["text"]
+
+        contents = []
+        for md_file in files:
+            try:
+                contents.append(md_file.read_text(encoding="utf-8"))
+            except Exception as e:
+                contents.append(e)
+
+        combined = _combine(files, contents)
+        _cache["sig"] = sig
+        _cache["text"] = combined
+        return combined
+
+
+async def load_knowledge_async() -> str:
+    """Async variant of load_knowledge() for use on the event loop.
+
+    Directory scan and file reads run in worker threads (reads in parallel),
+    so a cache refresh doesn't block other requests.
+
+    Returns:
+        Combined content of all knowledge documents.
+    """
+    if not KNOWLEDGE_DIR.exists():
+        logger.warning(f"Knowledge directory not found: {KNOWLEDGE_DIR}")
+        return ""
+
+    files, sig = await asyncio.to_thread(_scan)
+    if sig == _cache["sig"]:
+        return _cache["text"]
+
+    contents = await asyncio.gather(
+        *(asyncio.to_thread(md_file.read_text, encoding="utf-8") for md_file in files),
+        return_exceptions=True,
+    )
+
+    combined = _combine(files, contents)
+    with _cache_lock:
+        _cache["sig"] = sig
+        _cache["text"] = combined
+    return combined
+
+
+def _combine(files: list[Path], contents: list) -> str:
+    """Combine file contents into one context string.
+
+    Args:
+        files: Knowledge files, in load order.
+        contents: Text of each file, or the exception raised while reading it.
+    """
+    buf = io.StringIO()
+    doc_count = 0
+    for md_file, content in zip(files, contents):
+        if isinstance(content, BaseException):
+            logger.error(f"Failed to read {md_file}: {content}")
             continue
-        try:
-            content = md_file.read_text(encoding="utf-8").strip()
-            if content:
-                documents.append(f"--- {md_file.stem.upper()} ---\n{content}")
-                logger.debug(f"Loaded knowledge: {md_file.name} ({len(content)} chars)")
-        except Exception as e:
-            logger.error(f"Failed to read {md_file}: {e}")
-
-    if not documents:
+        # str.strip() returns the same object when there is nothing to strip
+        content = content.strip()
+        if not content:
+            continue
+        if doc_count:
+            buf.write("\n\n")
+        buf.write("--- ")
+        buf.write(md_file.stem.upper())
+        buf.write(" ---\n")
+        buf.write(content)
+        doc_count += 1
+        logger.debug(f"Loaded knowledge: {md_file.name} ({len(content)} chars)")
+
+    if not doc_count:
         logger.warning("No knowledge documents found")
         return ""
 
-    combined = "\n\n".join(documents)
-    logger.info(f"Loaded {len(documents)} knowledge docs ({len(combined)} chars total)")
+    combined = buf.getvalue()
+    logger.info(f"Loaded {doc_count} knowledge docs ({len(combined)} chars total)")
     return combined
 
 
+def _split_sections(knowledge: str) -> list[tuple[str, str, str]]:
+    """Split combined knowledge into (doc_name, title, body) sections.
+
+    Each document (--- NAME --- header) is split further at its ## headings.
+    """
+    sections = []
+    headers = list(_DOC_HEADER_RE.finditer(knowledge))
+    for i, header in enumerate(headers):
+        doc_name = header.group(1)
+        end = headers[i + 1].start() if i + 1 < len(headers) else len(knowledge)
+        doc = knowledge[header.end():end].strip()
+
+        starts = [m.start() for m in _SECTION_RE.finditer(doc)]
+        if not starts or starts[0] != 0:
+            starts.insert(0, 0)
+        for j, start in enumerate(starts):
+            body = doc[start:starts[j + 1] if j + 1 < len(starts) else len(doc)].strip()
+            if not body:
+                continue
+            heading = body.splitlines()[0].lstrip("#").strip() if body.startswith("## ") else ""
+            title = f"{doc_name} / {heading}" if heading else doc_name
+            sections.append((doc_name, title, body))
+    return sections
+
+
+def _tokenize(text: str) -> list[str]:
+    return _TOKEN_RE.findall(text.lower())
+
+
+@functools.lru_cache(maxsize=2)
+def _knowledge_index(knowledge: str) -> tuple[list[tuple[str, str, str]], dict[str, float], list[dict[str, float]]]:
+    """Build a TF-IDF index over the sections of a knowledge string.
+
+    Cached per knowledge version — the loader hands out the same string object
+    until the docs change, so lookups after the first are free.
+
+    Returns:
+        Tuple of (sections, idf weights, normalized per-section term vectors).
+    """
+    sections = _split_sections(knowledge)
+    counts = [Counter(_tokenize(f"{title}\n{body}")) for _, title, body in sections]
+
+    doc_freq = Counter()
+    for tf in counts:
+        doc_freq.update(tf.keys())
+    n = len(sections)
+    idf = {term: math.log((1 + n) / (1 + df)) + 1 for term, df in doc_freq.items()}
+
+    vectors = []
+    for tf in counts:
+        vec = {term: count * idf[term] for term, count in tf.items()}
+        norm = math.sqrt(sum(w * w for w in vec.values())) or 1.0
+        vectors.append({term: w / norm for term, w in vec.items()})
+    return sections, idf, vectors
+
+
+def select_knowledge(knowledge: str, query: str, k: int = 5) -> str:
+    """Return only the k knowledge sections most relevant to a query.
+
+    Sections of KNOWLEDGE_PINNED_DOCS (e.g. agent_rules) are always included
+    and don't count towards k.
+
+    Args:
+        knowledge: Combined knowledge string from load_knowledge().
+        query: Text to match against (e.g. the user's recent messages).
+        k: Maximum number of sections to include.
+
+    Returns:
+        Selected sections in their original order, formatted like the combined
+        knowledge. Falls back to the full knowledge if nothing matches.
+    """
+    sections, idf, vectors = _knowledge_index(knowledge)
+    query_tf = Counter(t for t in _tokenize(query) if t in idf)
+    if not sections or not query_tf:
+        return knowledge
+
+    pinned = [i for i, section in enumerate(sections) if section[0] in KNOWLEDGE_PINNED_DOCS]
+    scores = []
+    for i, vec in enumerate(vectors):
+        if sections[i][0] in KNOWLEDGE_PINNED_DOCS:
+            continue
+        score = sum(count * idf[term] * vec.get(term, 0.0) for term, count in query_tf.items())
+        if score > 0:
+            scores.append((score, i))
+    if not scores:
+        return knowledge
+
+    top = sorted(pinned + [i for _, i in sorted(scores, reverse=True)[:k]])
+    selected = "\n\n".join(f"--- {sections[i][1]} ---\n{sections[i][2]}" for i in top)
+    logger.debug(f"Selected {len(top)}/{len(sections)} knowledge sections ({len(selected)} chars)")
+    return selected
+
+
 def load_prompt(name: str, default: str = "") -> str:
     """Load a prompt template from knowledge/prompt_{name}.md.
 
@@ -14,17 +14,20 @@ and posts call/chat summaries back to n8n for automation.
 
 import argparse
 import asyncio
+import functools
 import os
 import re
 import secrets
 import signal
 import sys
 from contextlib import asynccontextmanager
+from dataclasses import dataclass
 from datetime import datetime, timedelta, timezone
 from pathlib import Path
 from typing import Optional
 
 import aiohttp
+import orjson
 import uvicorn
 from dotenv import load_dotenv
 from fastapi import (
@@ -35,16 +38,27 @@ from fastapi import (
     Header,
     HTTPException,
     Request,
+    Response,
 )
 from fastapi.responses import FileResponse, HTMLResponse, JSONResponse, RedirectResponse
 from fastapi.staticfiles import StaticFiles
 from loguru import logger
+
+try:
+    import uvloop
+except ImportError:  # Not available on Windows
+    uvloop = None
+from pipecat.audio.vad.silero import SileroVADAnalyzer
 from pipecat.transports.smallwebrtc.connection import SmallWebRTCConnection
 from pipecat.transports.whatsapp.api import WhatsAppWebhookRequest
 from pipecat.transports.whatsapp.client import WhatsAppClient
 
+# Load .env once, before first-party modules read their config at import time
+load_dotenv(override=True)
+
+import hooks
 import media_storage
-from bot import run_bot
+from bot import run_bot, warm_up
 from chat_db import (
     get_conversation,
     get_conversation_messages,
@@ -83,7 +97,7 @@ from campaign_db import (
 )
 from campaign_runner import is_campaign_running, request_pause, run_campaign
 from db import complete_call_record, delete_call, delete_calls_bulk, get_call, get_recent_calls, get_stats, init_db, resolve_call
-from knowledge import KNOWLEDGE_DIR, load_knowledge
+from knowledge import KNOWLEDGE_DIR, load_knowledge_async
 from message_router import route_webhook
 from orders import handle_razorpay_webhook
 from orders_db import get_order, get_order_stats, list_orders as list_orders_db
@@ -94,8 +108,6 @@ from whatsapp_messaging import (
     send_whatsapp_text,
 )
 
-load_dotenv(override=True)
-
 # Config
 WHATSAPP_TOKEN = os.getenv("WHATSAPP_TOKEN")
 WHATSAPP_PHONE_NUMBER_ID = os.getenv("WHATSAPP_PHONE_NUMBER_ID")
@@ -149,6 +161,12 @@ KNOWLEDGE_DIR.mkdir(exist_ok=True)
 whatsapp_client: Optional[WhatsAppClient] = None
 shutdown_event = asyncio.Event()
 knowledge_context = ""
+vad_analyzer: Optional[SileroVADAnalyzer] = None  # Loaded once, model shared by all calls
+
+# Voice call concurrency cap — extra calls are hung up instead of degrading every call
+MAX_CONCURRENT_CALLS = max(1, int(os.getenv("MAX_CONCURRENT_CALLS", "16")))
+call_semaphore = asyncio.Semaphore(MAX_CONCURRENT_CALLS)
+call_tasks: set[asyncio.Task] = set()  # Running bot/call tasks: strong refs + drained on shutdown
 
 # In-memory session store: {token: expiry_datetime}
 active_sessions: dict[str, datetime] = {}
@@ -265,6 +283,56 @@ async def _run_with_timeout(coro, timeout=BACKGROUND_TASK_TIMEOUT, task_name="ba
         logger.error(f"{task_name} error: {e}")
 
 
+CALL_SHUTDOWN_TIMEOUT = 5.0  # seconds to wait for calls to hang up on shutdown
+CALL_DRAIN_TIMEOUT = 30.0  # seconds for hung-up bots to finalize (DB, recording, hooks)
+
+
+async def _run_call_bot(connection: SmallWebRTCConnection, *args):
+    """Run the voice bot for a connection.
+
+    The caller must have acquired call_semaphore; it is released here.
+    """
+    try:
+        await run_bot(connection, *args)
+    except Exception as e:
+        logger.error(f"Voice bot error on {connection.pc_id}: {e}")
+    finally:
+        call_semaphore.release()
+
+
+async def drain_call_tasks():
+    """Wait for voice bot tasks to finish finalizing, cancelling stragglers.
+
+    Runs after terminate_all_calls() and before the hooks/HTTP session close,
+    so each bot can still save its call record and post its summary.
+    """
+    if not call_tasks:
+        return
+    logger.info(f"Waiting for {len(call_tasks)} call(s) to finalize")
+    _, pending = await asyncio.wait(set(call_tasks), timeout=CALL_DRAIN_TIMEOUT)
+    if pending:
+        logger.warning(f"{len(pending)} call(s) did not finalize within {CALL_DRAIN_TIMEOUT}s, cancelling")
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+
+
+async def terminate_all_calls():
+    """Hang up all active calls, bounded by CALL_SHUTDOWN_TIMEOUT.
+
+    WhatsAppClient already terminates calls in parallel; this only keeps a
+    stuck Graph API request from blocking shutdown.
+    """
+    if not whatsapp_client:
+        return
+    try:
+        await asyncio.wait_for(whatsapp_client.terminate_all_calls(), timeout=CALL_SHUTDOWN_TIMEOUT)
+    except asyncio.TimeoutError:
+        logger.warning(f"Terminating calls timed out after {CALL_SHUTDOWN_TIMEOUT}s")
+    except Exception as e:
+        logger.warning(f"Error terminating calls: {e}")
+
+
 def signal_handler():
     logger.info("Shutdown signal received")
     shutdown_event.set()
@@ -272,7 +340,7 @@ def signal_handler():
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    global whatsapp_client, knowledge_context
+    global whatsapp_client, knowledge_context, vad_analyzer
 
     # Initialize database
     await init_db()
@@ -281,21 +349,38 @@ async def lifespan(app: FastAPI):
     media_storage.init_bucket()
 
     # Load knowledge docs at startup
-    knowledge_context = load_knowledge()
+    knowledge_context = await load_knowledge_async()
     logger.info(f"Knowledge loaded: {len(knowledge_context)} characters")
 
-    async with aiohttp.ClientSession() as session:
+    # Load the Silero VAD model once instead of per call
+    vad_analyzer = await asyncio.to_thread(SileroVADAnalyzer)
+    await warm_up()
+
+    # One tuned pool for the Graph API (single host) + n8n: keepalive and DNS
+    # caching avoid a fresh TCP/TLS handshake on call accept/terminate
+    connector = aiohttp.TCPConnector(
+        limit=64, limit_per_host=32, ttl_dns_cache=300, keepalive_timeout=75,
+    )
+    async with aiohttp.ClientSession(
+        connector=connector, timeout=aiohttp.ClientTimeout(total=15),
+    ) as session:
         whatsapp_client = WhatsAppClient(
             whatsapp_token=WHATSAPP_TOKEN,
             phone_number_id=WHATSAPP_PHONE_NUMBER_ID,
             session=session,
         )
         logger.info("WhatsApp client initialized")
+
+        # Share the long-lived session with the n8n hooks
+        hooks.init_session(session)
+        hooks.start_call_flusher()
         try:
             yield
         finally:
-            if whatsapp_client:
-                await whatsapp_client.terminate_all_calls()
+            await terminate_all_calls()
+            await drain_call_tasks()
+            await hooks.stop_call_flusher()
+            await hooks.close_session()
             logger.info("Cleanup done")
 
 
@@ -432,6 +517,96 @@ async def verify_webhook(request: Request):
         raise HTTPException(status_code=403, detail="Verification failed")
 
 
+@dataclass(slots=True)
+class CallContext:
+    """Per-webhook state needed to start the bot once WhatsApp connects the call."""
+
+    knowledge: str
+    caller_phone: str
+    caller_name: str
+    reserved_slots: int = 0  # call_semaphore slots taken before accepting
+
+
+async def _reserve_call_slots(count: int) -> bool:
+    """Take `count` call_semaphore slots, or none at all if at capacity."""
+    taken = 0
+    while taken < count and not call_semaphore.locked():
+        # Not locked, so this acquires without yielding
+        await call_semaphore.acquire()
+        taken += 1
+    if taken < count:
+        for _ in range(taken):
+            call_semaphore.release()
+        return False
+    return True
+
+
+async def _reject_call(call_id: str):
+    """Reject an incoming call before it is answered.
+
+    Goes through the WhatsApp client's own Graph API wrapper, so it uses the
+    same API version and pooled session as pre-accept/accept.
+    """
+    try:
+        await whatsapp_client._whatsapp_api.reject_call_to_whatsapp(call_id)
+        logger.info(f"Rejected WhatsApp call {call_id}")
+    except Exception as e:
+        logger.error(f"Failed to reject call {call_id}: {e}")
+
+
+def _track_call_task(coro) -> asyncio.Task:
+    """Run a call-related coroutine as a task that shutdown drains (call_tasks)."""
+    task = asyncio.create_task(coro)
+    call_tasks.add(task)
+    task.add_done_callback(call_tasks.discard)
+    return task
+
+
+async def _terminate_call(connection: SmallWebRTCConnection):
+    """Hang up an already-accepted call via the Graph API and drop its connection."""
+    ongoing = getattr(whatsapp_client, "_ongoing_calls_map", {})
+    for call_id in [cid for cid, conn in ongoing.items() if conn is connection]:
+        try:
+            await whatsapp_client._whatsapp_api.terminate_call_to_whatsapp(call_id)
+            logger.info(f"Terminated WhatsApp call {call_id}")
+        except Exception as e:
+            logger.error(f"Failed to terminate call {call_id}: {e}")
+    try:
+        await connection.disconnect()
+    except Exception:
+        pass
+
+
+async def _start_call_bot(ctx: CallContext, connection: SmallWebRTCConnection):
+    """WhatsApp connection callback: start the voice bot for an accepted call.
+
+    Uses a slot reserved in handle_webhook before the call was accepted. If
+    none was reserved (e.g. the callback fired after the request finished),
+    takes one now or hangs the call up through the Graph API when at capacity.
+    """
+    if ctx.reserved_slots > 0:
+        ctx.reserved_slots -= 1
+    elif not await _reserve_call_slots(1):
+        logger.warning(
+            f"At capacity ({MAX_CONCURRENT_CALLS} calls), terminating call from {ctx.caller_phone}"
+        )
+        await _terminate_call(connection)
+        _track_call_task(hooks.send_call_rejected(ctx.caller_phone, ctx.caller_name, "busy"))
+        return
+
+    try:
+        logger.info(f"Auto-accepted call, starting AI bot: {connection.pc_id}")
+        _track_call_task(
+            _run_call_bot(
+                connection, ctx.knowledge, ctx.caller_phone, ctx.caller_name, vad_analyzer,
+            )
+        )
+    except Exception as e:
+        call_semaphore.release()
+        logger.error(f"Failed to start bot: {e}")
+        await _terminate_call(connection)
+
+
 @app.post("/")
 async def handle_webhook(body: WhatsAppWebhookRequest, background_tasks: BackgroundTasks):
     """Handle incoming WhatsApp call webhooks from n8n.
@@ -441,15 +616,27 @@ async def handle_webhook(body: WhatsAppWebhookRequest, background_tasks: Backgro
     if body.object != "whatsapp_business_account":
         raise HTTPException(status_code=400, detail="Invalid object type")
 
-    logger.info(f"Webhook received: {body.dict()}")
+    # Full payload only at TRACE (--verbose); lazy so it isn't serialized otherwise
+    logger.opt(lazy=True).trace("Webhook received: {}", lambda: body.model_dump())
 
     # Extract caller info from webhook payload
     caller_phone = ""
     caller_name = ""
+    call_ref = ""
+    connect_call_ids = []
+    other_call_events = 0
     try:
         for entry in body.entry:
             for change in entry.changes:
                 value = change.value
+                for call in getattr(value, "calls", None) or []:
+                    if getattr(call, "event", "") == "connect":
+                        connect_call_ids.append(call.id)
+                    else:
+                        other_call_events += 1
+                if not call_ref and getattr(value, "calls", None):
+                    call = value.calls[0]
+                    call_ref = f"{getattr(call, 'event', '')} {getattr(call, 'id', '')}".strip()
                 if hasattr(value, "contacts") and value.contacts:
                     contact = value.contacts[0]
                     caller_phone = contact.wa_id
@@ -461,26 +648,40 @@ async def handle_webhook(body: WhatsAppWebhookRequest, background_tasks: Backgro
     except Exception as e:
         logger.warning(f"Could not extract caller info: {e}")
 
-    logger.info(f"Caller: {caller_phone} ({caller_name})")
+    logger.info(f"Call webhook {call_ref or '-'}: caller {caller_phone} ({caller_name})")
 
-    # Reload knowledge on each call (allows updating docs without restart)
-    current_knowledge = load_knowledge()
-
-    async def connection_callback(connection: SmallWebRTCConnection):
-        try:
-            logger.info(f"Auto-accepted call, starting AI bot: {connection.pc_id}")
-            background_tasks.add_task(
-                run_bot, connection, current_knowledge, caller_phone, caller_name
+    # Check capacity before the client pre-accepts/accepts new calls, so a busy
+    # call is rejected through the Graph API instead of answered and dropped
+    reserved = 0
+    if connect_call_ids:
+        if await _reserve_call_slots(len(connect_call_ids)):
+            reserved = len(connect_call_ids)
+        else:
+            logger.warning(
+                f"At capacity ({MAX_CONCURRENT_CALLS} calls), rejecting call from {caller_phone}"
             )
-        except Exception as e:
-            logger.error(f"Failed to start bot: {e}")
-            try:
-                await connection.disconnect()
-            except Exception:
-                pass
+            for call_id in connect_call_ids:
+                await _reject_call(call_id)
+            # Reported after the response; WhatsApp/n8n are waiting on this request
+            background_tasks.add_task(hooks.send_call_rejected, caller_phone, caller_name, "busy")
+            if not other_call_events:
+                return {"status": "busy"}
+            # Let the client handle only the remaining (non-connect) call events
+            for entry in body.entry:
+                for change in entry.changes:
+                    calls = getattr(change.value, "calls", None)
+                    if calls:
+                        change.value.calls = [c for c in calls if getattr(c, "event", "") != "connect"]
+
+    # Knowledge is cached and only re-read when docs change (no restart needed)
+    current_knowledge = await load_knowledge_async()
+
+    ctx = CallContext(current_knowledge, caller_phone, caller_name, reserved)
 
     try:
-        result = await whatsapp_client.handle_webhook_request(body, connection_callback)
+        result = await whatsapp_client.handle_webhook_request(
+            body, functools.partial(_start_call_bot, ctx)
+        )
         return {"status": "success"}
     except ValueError as ve:
         logger.warning(f"Invalid webhook: {ve}")
@@ -488,6 +689,11 @@ async def handle_webhook(body: WhatsAppWebhookRequest, background_tasks: Backgro
     except Exception as e:
         logger.error(f"Webhook processing error: {e}")
         raise HTTPException(status_code=500, detail="Internal error")
+    finally:
+        # Slots for calls that never connected (accept failed etc.)
+        for _ in range(ctx.reserved_slots):
+            call_semaphore.release()
+        ctx.reserved_slots = 0
 
 
 # --- WhatsApp Text Message Webhook (validated by secret, not session auth) ---
@@ -558,7 +764,7 @@ async def handle_text_webhook(request: Request, background_tasks: BackgroundTask
     logger.info(f"Text from {sender_phone} ({sender_name}): {message_text[:100]}")
 
     # Reload knowledge (allows live updates)
-    current_knowledge = load_knowledge()
+    current_knowledge = await load_knowledge_async()
 
     # Handle message in background with timeout
     background_tasks.add_task(
@@ -629,7 +835,7 @@ async def handle_unified_webhook(request: Request, background_tasks: BackgroundT
             return {"status": "error", "reason": "call forwarding failed"}
 
     # Reload knowledge for AI chatbot
-    current_knowledge = load_knowledge()
+    current_knowledge = await load_knowledge_async()
 
     # Route via message router (runs in background with timeout)
     async def _route():
@@ -1506,10 +1712,17 @@ async def dashboard():
 # --- Health (no auth) ---
 
 
+# Pre-encoded once: probes hit this constantly and the payload never changes
+_HEALTH_RESPONSE = Response(
+    content=orjson.dumps({"status": "ok", "service": APP_NAME, "version": "4.0.0"}),
+    media_type="application/json",
+)
+
+
 @app.get("/health")
 async def health():
     """Health check for Coolify."""
-    return {"status": "ok", "service": APP_NAME, "version": "4.0.0"}
+    return _HEALTH_RESPONSE
 
 
 async def run_server(host: str, port: int):
@@ -1520,7 +1733,9 @@ async def run_server(host: str, port: int):
         except NotImplementedError:
             pass  # Windows doesn't support add_signal_handler
 
-    config = uvicorn.Config(app, host=host, port=port, log_config=None)
+    # access_log off: the dashboard polls frequently and uvicorn's access logs
+    # aren't routed to loguru anyway (log_config=None)
+    config = uvicorn.Config(app, host=host, port=port, log_config=None, access_log=False)
     server = uvicorn.Server(config)
     server_task = asyncio.create_task(server.serve())
 
@@ -1528,8 +1743,7 @@ async def run_server(host: str, port: int):
 
     await shutdown_event.wait()
 
-    if whatsapp_client:
-        await whatsapp_client.terminate_all_calls()
+    await terminate_all_calls()
 
     server.should_exit = True
     await server_task
@@ -1545,7 +1759,11 @@ if __name__ == "__main__":
     logger.remove(0)
     logger.add(sys.stderr, level="TRACE" if args.verbose else "DEBUG")
 
+    # uvloop when available; uvicorn's own loop setting is ignored since we
+    # create the loop ourselves to run server.serve()
+    loop_factory = uvloop.new_event_loop if uvloop else None
     try:
-        asyncio.run(run_server(args.host, args.port))
+        with asyncio.Runner(loop_factory=loop_factory) as runner:
+            runner.run(run_server(args.host, args.port))
     except KeyboardInterrupt:
         logger.info("Server stopped")